@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'IPAI MCP Finance Tools',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.2.0',
     'category': 'Accounting/Finance',
     'summary': 'Finance-specific MCP tools for AI-driven accounting operations',
     'description': """
@@ -45,6 +45,7 @@ Extends mcp_server with finance-specific tools for InsightPulse AI:
         'security/ir.model.access.csv',
         'views/mcp_finance_config_views.xml',
         'data/mcp_finance_tools.xml',
+        'data/ir_cron.xml',
     ],
     'demo': [],
     'installable': True,
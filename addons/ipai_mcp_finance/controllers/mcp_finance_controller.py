@@ -6,27 +6,131 @@ HTTP endpoints for finance-specific MCP tools.
 
 Extends mcp_server controller with /mcp/finance/* endpoints.
 """
-from odoo import http
+from odoo import api, http
 from odoo.http import request, Response
+from odoo.modules.module import get_manifest
+from odoo.modules.registry import Registry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
 import json
 import logging
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _logger = logging.getLogger(__name__)
 
+# Tool schemas ship with the code, so the module version is part of ETags
+_MODULE_VERSION = get_manifest('ipai_mcp_finance')['version']
+
+# Threads per worker for parallel batch calls. Each holds its own cursor,
+# so keep this below db_maxconn (see infra/docker/odoo.conf).
+_BATCH_MAX_WORKERS = 8
+
+# Tools known to be read-only (audit logs aside, which use their own
+# cursor). Only these may run in parallel in a batch, each committing on a
+# separate cursor; anything else runs in the request transaction.
+_PARALLEL_TOOLS = frozenset({'get_trial_balance', 'generate_bir_2307'})
+
+# Map tool names to implementations
+_TOOL_MAP = {
+    'get_trial_balance': 'mcp.finance.tool.trial_balance',
+    'create_journal_entry': 'mcp.finance.tool.journal_entry',
+    'generate_bir_2307': 'mcp.finance.tool.bir_compliance',
+}
+
+
+def _json_default(value):
+    """stdlib json fallback, formatting datetimes the way orjson does."""
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return f"{text}Z" if value.tzinfo is None else text
+    return str(value)
+
+
+def _dumps(data):
+    """Encode data as JSON bytes, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=str,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(data, default=_json_default).encode()
+
+
+def _json_stream(key, rows):
+    """Yield {key: [rows...]} as JSON, one encoded row at a time."""
+    yield b'{"' + key.encode() + b'":['
+    first = True
+    for row in rows:
+        if not first:
+            yield b','
+        first = False
+        yield _dumps(row)
+    yield b']}'
+
 
 class McpFinanceController(http.Controller):
     """HTTP controller for MCP Finance tools."""
 
-    def _json_response(self, data, status=200):
+    # Subclasses may extend with {**_TOOL_MAP, 'name': 'model'}
+    _tool_map = _TOOL_MAP
+
+    # Shared by all batch requests in this worker, created on first use
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=_BATCH_MAX_WORKERS,
+                        thread_name_prefix='mcp_finance_batch',
+                    )
+        return cls._executor
+
+    def _json_response(self, data, status=200, headers=None):
         """Return JSON response."""
         return Response(
-            json.dumps(data, default=str),
+            _dumps(data),
             status=status,
-            headers={'Content-Type': 'application/json'},
+            headers={'Content-Type': 'application/json', **(headers or {})},
         )
 
+    def _etag(self, env, *parts):
+        """Build a quoted ETag from the tool registry's version plus parts."""
+        tools_version = env['mcp.finance.tool'].sudo()._get_tools_version()
+        key = repr((_MODULE_VERSION,) + tools_version + parts).encode()
+        return f'"{hashlib.blake2b(key, digest_size=8).hexdigest()}"'
+
+    def _not_modified(self, etag):
+        """Return a 304 response if the client already holds etag."""
+        if request.httprequest.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={'ETag': etag})
+        return None
+
+    def _get_payload(self):
+        """Return the JSON request body, parsed at most once per request."""
+        payload = getattr(request, '_mcp_payload', None)
+        if payload is None:
+            data = request.httprequest.get_data()
+            payload = orjson.loads(data) if orjson is not None else json.loads(data)
+            request._mcp_payload = payload
+        return payload
+
     def _check_auth(self):
-        """Check MCP authentication."""
+        """
+        Check MCP authentication.
+
+        Returns (env, error): env is bound to the authenticated user
+        without superuser rights, so handlers can use it directly.
+        """
         # Delegate to base MCP server auth
         # This checks API key from Authorization header
         auth_header = request.httprequest.headers.get('Authorization', '')
@@ -34,16 +138,29 @@ class McpFinanceController(http.Controller):
             return None, "Missing or invalid Authorization header"
         
         api_key = auth_header[7:]  # Remove 'Bearer ' prefix
-        
-        # Validate against user API keys
+
+        # Validate against user API keys (sudo: no user is authenticated yet)
+        uid = request.env['res.users.apikeys'].sudo()._mcp_resolve_uid(api_key)
+        user = request.env['res.users'].sudo().browse(uid).exists() if uid else None
+        if not user or not user.active:
+            return None, "Invalid API key"
+
+        return request.env(user=user.id, su=False), None
+
+        # Validate against user API keys (sudo: no user is authenticated yet)
         user = request.env['res.users'].sudo().search([
             ('api_key_ids.key', '=', api_key),
         ], limit=1)
-        
+
         if not user:
             return None, "Invalid API key"
-        
-        return user, None
+
+        with _AUTH_CACHE_LOCK:
+            if len(_AUTH_CACHE) >= _AUTH_CACHE_MAX:
+                _AUTH_CACHE.clear()
+            _AUTH_CACHE[cache_key] = (user.id, now + _AUTH_CACHE_TTL)
+
+        return request.env(user=user.id, su=False), None
 
     @http.route('/mcp/finance/health', type='http', auth='none', 
                 methods=['GET'], csrf=False)
@@ -52,114 +169,151 @@ class McpFinanceController(http.Controller):
         return self._json_response({
             'status': 'healthy',
             'module': 'ipai_mcp_finance',
-            'version': '18.0.1.0.0',
+            'version': _MODULE_VERSION,
         })
 
     @http.route('/mcp/finance/tools', type='http', auth='none',
                 methods=['GET'], csrf=False)
     def list_tools(self):
         """List available finance tools."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return self._json_response({'error': error}, status=401)
         
-        tools = request.env['mcp.finance.tool'].sudo().with_user(user).list_available_tools()
-        return self._json_response({'tools': tools})
+        # The listing also depends on the company's enable_* flags
+        config = env['mcp.finance.config'].get_config_snapshot()
+        etag = self._etag(env, env.company.id, config.write_date)
+        not_modified = self._not_modified(etag)
+        if not_modified:
+            return not_modified
+        
+        tools = env['mcp.finance.tool'].list_available_tools()
+        return self._json_response({'tools': tools}, headers={'ETag': etag})
 
     @http.route('/mcp/finance/tools/<string:tool_name>/schema', type='http',
                 auth='none', methods=['GET'], csrf=False)
     def tool_schema(self, tool_name):
         """Get schema for a specific tool."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return self._json_response({'error': error}, status=401)
         
-        # Map tool names to implementations
-        tool_map = {
-            'get_trial_balance': 'mcp.finance.tool.trial_balance',
-            'create_journal_entry': 'mcp.finance.tool.journal_entry',
-            'generate_bir_2307': 'mcp.finance.tool.bir_compliance',
-        }
-        
-        if tool_name not in tool_map:
+        model = self._tool_map.get(tool_name)
+        if model is None:
             return self._json_response(
                 {'error': f'Unknown tool: {tool_name}'}, 
                 status=404
             )
         
-        tool = request.env[tool_map[tool_name]].sudo().with_user(user)
-        schema = tool.get_tool_schema()
+        etag = self._etag(env, tool_name)
+        not_modified = self._not_modified(etag)
+        if not_modified:
+            return not_modified
+        
+        schema = env[model].get_tool_schema()
         
-        return self._json_response({'schema': schema})
+        return self._json_response({'schema': schema}, headers={'ETag': etag})
+
+    def _dispatch(self, env, tool_name, params):
+        """Execute one tool call in the authenticated user's env."""
+        model = self._tool_map.get(tool_name)
+        if model is None:
+            return {'error': f'Unknown tool: {tool_name}'}
+        
+        return env[model].execute(params)
+
+    def _dispatch_in_thread(self, dbname, uid, context, tool_name, params):
+        """Execute one tool call on its own cursor (for executor threads)."""
+        try:
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                return env[self._tool_map[tool_name]].execute(params)
+        except Exception as e:
+            _logger.exception(f"Batch call {tool_name} failed: {e}")
+            return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
 
     @http.route('/mcp/finance/tools/<string:tool_name>/execute', type='json',
                 auth='none', methods=['POST'], csrf=False)
     def execute_tool(self, tool_name):
         """Execute a finance tool."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return {'error': error}
         
-        # Map tool names to implementations
-        tool_map = {
-            'get_trial_balance': 'mcp.finance.tool.trial_balance',
-            'create_journal_entry': 'mcp.finance.tool.journal_entry',
-            'generate_bir_2307': 'mcp.finance.tool.bir_compliance',
-        }
+        # Get parameters from request
+        params = self._get_payload().get('params', {})
+        return self._dispatch(env, tool_name, params)
+
+    @http.route('/mcp/finance/batch', type='json',
+                auth='none', methods=['POST'], csrf=False)
+    def batch(self):
+        """
+        Execute several tool calls in one request.
+
+        Expects params {'calls': [{'tool': <name>, 'params': {...}}, ...]}
+        and returns {'results': [...]} in the same order. Authentication
+        runs once for the whole batch.
+        """
+        env, error = self._check_auth()
+        if error:
+            return {'error': error}
         
-        if tool_name not in tool_map:
-            return {'error': f'Unknown tool: {tool_name}'}
+        calls = self._get_payload().get('params', {}).get('calls')
+        if not isinstance(calls, list):
+            return {'error': 'calls is required and must be a list'}
         
-        # Get parameters from request
-        params = request.jsonrequest.get('params', {})
+        # Calls to read-only tools run in parallel on the shared executor;
+        # the rest run here, in order, in the request transaction.
+        results = [None] * len(calls)
+        futures = {}
+        for i, call in enumerate(calls):
+            if not isinstance(call, dict) or not isinstance(call.get('tool'), str) or not call['tool']:
+                results[i] = {'error': 'Each call needs a tool name'}
+            elif call['tool'] in _PARALLEL_TOOLS and call['tool'] in self._tool_map:
+                futures[i] = self._get_executor().submit(
+                    self._dispatch_in_thread, request.db, env.uid,
+                    dict(env.context), call['tool'], call.get('params') or {},
+                )
+            else:
+                results[i] = self._dispatch(env, call['tool'], call.get('params') or {})
         
-        # Execute tool
-        tool = request.env[tool_map[tool_name]].sudo().with_user(user)
-        result = tool.execute(params)
+        for i, future in futures.items():
+            results[i] = future.result()
         
-        return result
+        return {'results': results}
 
     @http.route('/mcp/finance/trial-balance', type='json',
                 auth='none', methods=['POST'], csrf=False)
     def trial_balance(self):
         """Direct endpoint for trial balance."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return {'error': error}
-        
-        params = request.jsonrequest
-        tool = request.env['mcp.finance.tool.trial_balance'].sudo().with_user(user)
-        return tool.execute(params)
+        return self._dispatch(env, 'get_trial_balance', self._get_payload())
 
     @http.route('/mcp/finance/journal-entry', type='json',
                 auth='none', methods=['POST'], csrf=False)
     def journal_entry(self):
         """Direct endpoint for journal entry creation."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return {'error': error}
-        
-        params = request.jsonrequest
-        tool = request.env['mcp.finance.tool.journal_entry'].sudo().with_user(user)
-        return tool.execute(params)
+        return self._dispatch(env, 'create_journal_entry', self._get_payload())
 
     @http.route('/mcp/finance/bir-2307', type='json',
                 auth='none', methods=['POST'], csrf=False)
     def bir_2307(self):
         """Direct endpoint for BIR 2307 generation."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return {'error': error}
-        
-        params = request.jsonrequest
-        tool = request.env['mcp.finance.tool.bir_compliance'].sudo().with_user(user)
-        return tool.execute(params)
+        return self._dispatch(env, 'generate_bir_2307', self._get_payload())
 
     @http.route('/mcp/finance/executions', type='http',
                 auth='none', methods=['GET'], csrf=False)
     def list_executions(self):
         """List recent tool executions (audit log)."""
-        user, error = self._check_auth()
+        env, error = self._check_auth()
         if error:
             return self._json_response({'error': error}, status=401)
         
@@ -170,7 +324,7 @@ class McpFinanceController(http.Controller):
         
         domain = []
         if tool_name:
-            tool = request.env['mcp.finance.tool'].search(
+            tool = env['mcp.finance.tool'].search(
                 [('technical_name', '=', tool_name)], limit=1
             )
             if tool:
@@ -179,20 +333,33 @@ class McpFinanceController(http.Controller):
         if state:
             domain.append(('state', '=', state))
         
-        executions = request.env['mcp.finance.tool.execution'].sudo().with_user(user).search(
+        executions = env['mcp.finance.tool.execution'].search(
             domain, limit=limit, order='create_date desc'
         )
         
-        data = []
-        for ex in executions:
-            data.append({
-                'id': ex.id,
-                'tool': ex.tool_id.technical_name,
-                'state': ex.state,
-                'user': ex.user_id.name,
-                'created': ex.create_date.isoformat(),
-                'execution_time_ms': ex.execution_time_ms,
-                'error': ex.error_message,
-            })
-        
-        return self._json_response({'executions': data})
+        # Batch-read all rows and resolve related names once, instead of
+        # traversing tool_id/user_id per record.
+        rows = executions.read([
+            'tool_id', 'state', 'user_id', 'create_date',
+            'execution_time_ms', 'error_message',
+        ])
+        tool_names = {t.id: t.technical_name for t in executions.mapped('tool_id')}
+        user_names = {u.id: u.name for u in executions.mapped('user_id')}
+
+        data = ({
+            'id': row['id'],
+            'tool': tool_names.get(row['tool_id'] and row['tool_id'][0]),
+            'state': row['state'],
+            'user': user_names.get(row['user_id'] and row['user_id'][0]),
+            'created': row['create_date'],
+            'execution_time_ms': row['execution_time_ms'],
+            'error': row['error_message'],
+        } for row in rows)
+
+        # Stream rows as they are encoded rather than buffering the body
+        return Response(
+            _json_stream('executions', data),
+            status=200,
+            mimetype='application/json',
+            direct_passthrough=True,
+        )
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Convert execution log payload columns from TEXT (JSON strings) to jsonb.
+
+Done in place so existing audit rows are kept; left to the ORM, the type
+change would rename the old columns aside and start with empty ones.
+"""
+import json
+import logging
+import math
+
+_logger = logging.getLogger(__name__)
+
+
+def _finite(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _clean_non_finite(cr, column):
+    """Rewrite rows where json.dumps wrote NaN/Infinity, which jsonb rejects."""
+    cr.execute(f"""
+        SELECT id, {column} FROM mcp_finance_tool_execution
+         WHERE {column} ~ '(NaN|Infinity)'
+    """)
+    for record_id, payload in cr.fetchall():
+        try:
+            cleaned = json.dumps(_finite(json.loads(payload)))
+        except ValueError:
+            cleaned = None
+        if cleaned == payload:
+            continue
+        cr.execute(
+            f"UPDATE mcp_finance_tool_execution SET {column} = %s WHERE id = %s",
+            (cleaned, record_id),
+        )
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    for column in ('parameters', 'result'):
+        cr.execute("""
+            SELECT data_type FROM information_schema.columns
+             WHERE table_name = 'mcp_finance_tool_execution'
+               AND column_name = %s
+        """, (column,))
+        row = cr.fetchone()
+        if not row or row[0] == 'jsonb':
+            continue
+        _clean_non_finite(cr, column)
+        cr.execute(f"""
+            ALTER TABLE mcp_finance_tool_execution
+            ALTER COLUMN {column} TYPE jsonb
+            USING NULLIF({column}, '')::jsonb
+        """)
+        _logger.info("Converted mcp_finance_tool_execution.%s to jsonb", column)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Bring the registered tool schemas in line with the tools.
+
+The tool records are noupdate, so upgrades never rewrite them. Only the
+changed keys (and the BIR description sentence) are patched, so other
+edits to the stored records survive.
+"""
+import json
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def _patch_schema(env, xmlid, patch):
+    tool = env.ref(xmlid, raise_if_not_found=False)
+    if not tool:
+        return
+    try:
+        schema = json.loads(tool.parameter_schema or '{}')
+    except ValueError:
+        _logger.warning("Leaving unparsable parameter schema of %s as is", xmlid)
+        return
+    patch(schema.setdefault('properties', {}))
+    tool.parameter_schema = json.dumps(schema, indent=4)
+    _logger.info("Updated parameter schema of %s", xmlid)
+
+
+def _add_trial_balance_format(properties):
+    properties.setdefault('format', {
+        'type': 'string', 'enum': ['rows', 'columns'], 'default': 'rows',
+    })
+
+
+def _drop_bir_pdf(properties):
+    output_format = properties.get('output_format')
+    if output_format and 'pdf' in output_format.get('enum', ()):
+        output_format['enum'] = [value for value in output_format['enum'] if value != 'pdf']
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _patch_schema(env, 'ipai_mcp_finance.tool_get_trial_balance', _add_trial_balance_format)
+    # PDF output is not implemented; stop advertising it
+    _patch_schema(env, 'ipai_mcp_finance.tool_generate_bir_2307', _drop_bir_pdf)
+    bir_tool = env.ref('ipai_mcp_finance.tool_generate_bir_2307', raise_if_not_found=False)
+    if bir_tool and bir_tool.description:
+        bir_tool.description = bir_tool.description.replace(
+            'Outputs DAT file for BIR upload, Excel, or PDF.',
+            'Outputs DAT file for BIR upload or Excel.',
+        )
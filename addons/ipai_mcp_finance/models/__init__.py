@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import mcp_finance_config
 from . import mcp_finance_tool
+from . import res_users_apikeys
+from . import account_move
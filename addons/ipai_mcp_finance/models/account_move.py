@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred Journal Entry Posting
+------------------------------
+Journal entries created through MCP with auto_post are flagged here and
+posted in batches by a cron, so the tool call returns without waiting
+on sequencing and posting checks. Also holds the journal item index used
+by the BIR 2307 tool.
+
+Smart Delta: GAP_DELTA - extends account.move and account.move.line via _inherit
+"""
+from odoo import models, fields, api, _
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountMove(models.Model):
+    """Queue MCP-created moves for posting."""
+
+    _inherit = 'account.move'
+
+    # Only set by the tool (as superuser); the cron posts as superuser too,
+    # so users must not be able to flag moves themselves
+    mcp_auto_post_pending = fields.Boolean(
+        string='MCP Auto-Post Pending',
+        copy=False,
+        groups='base.group_system',
+    )
+
+    def init(self):
+        super().init()
+        # The cron polls for a handful of flagged moves in a large table
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS account_move_mcp_auto_post_pending_idx
+                ON account_move (id)
+                WHERE mcp_auto_post_pending
+        """)
+
+    @api.model
+    def _cron_post_mcp_pending_moves(self, batch_size=500):
+        """Post flagged draft moves, one batch per run."""
+        moves = self.sudo().search([('mcp_auto_post_pending', '=', True)], limit=batch_size)
+        if not moves:
+            return
+
+        # Moves posted or cancelled in the meantime are just unflagged
+        to_post = moves.filtered(lambda move: move.state == 'draft')
+        try:
+            with self.env.cr.savepoint():
+                to_post.action_post()
+        except Exception:
+            # Fall back to one by one so a single bad move can't block the rest
+            for move in to_post:
+                try:
+                    with self.env.cr.savepoint():
+                        move.action_post()
+                except Exception as e:
+                    _logger.exception(f"MCP auto-post failed for move {move.id}")
+                    # The flag is cleared below, so leave a visible trace
+                    # for whoever picks the draft up
+                    move.message_post(body=_(
+                        "Automatic posting requested through MCP failed: %s", e,
+                    ))
+        moves.write({'mcp_auto_post_pending': False})
+
+        if len(moves) == batch_size:
+            self.env.ref('ipai_mcp_finance.ir_cron_post_mcp_pending_moves')._trigger()
+
+
+class AccountMoveLine(models.Model):
+    """Index withholding tax lines for the BIR 2307 tool."""
+
+    _inherit = 'account.move.line'
+
+    def init(self):
+        super().init()
+        # Withholding lines are looked up by tax_line_id; most journal items
+        # have none, so a partial index stays small. init() runs inside the
+        # upgrade transaction, so this cannot be CONCURRENTLY: on a large
+        # table, create it by hand beforehand (same name) to avoid the lock.
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS idx_aml_tax_line_id
+                ON account_move_line (tax_line_id)
+                WHERE tax_line_id IS NOT NULL
+        """)
@@ -6,11 +6,28 @@ Extends MCP server settings with finance-specific options.
 
 Smart Delta: GAP_DELTA - extends mcp_server via _inherit
 """
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from collections import namedtuple
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Immutable view of a company's config, safe to keep in the ormcache
+ConfigSnapshot = namedtuple('ConfigSnapshot', [
+    'enable_trial_balance',
+    'enable_journal_entry',
+    'enable_month_end',
+    'enable_bir_tools',
+    'enable_aging_report',
+    'require_approval_je',
+    'max_je_amount',
+    'log_all_queries',
+    'write_date',
+])
+
+# res.company fields cached by ResCompany._mcp_lock_dates
+_LOCK_DATE_FIELDS = frozenset({'fiscalyear_lock_date', 'period_lock_date'})
+
 
 class McpFinanceConfig(models.Model):
     """Finance-specific MCP configuration settings."""
@@ -83,6 +100,22 @@ class McpFinanceConfig(models.Model):
         ('company_unique', 'UNIQUE(company_id)', 'Only one MCP Finance config per company'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
     @api.model
     def get_config(self, company_id=None):
         """Get or create finance config for company."""
@@ -93,6 +126,33 @@ class McpFinanceConfig(models.Model):
             _logger.info(f"Created MCP Finance config for company {company_id}")
         return config
 
+    @api.model
+    def get_config_snapshot(self, company_id=None):
+        """Return the company's config as a cached ConfigSnapshot."""
+        return self._get_config_snapshot(company_id or self.env.company.id)
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_config_snapshot(self, company_id):
+        # Shared by every user, so read as superuser; cleared on any config
+        # change. Never writes: configs are created with their company.
+        config = self.sudo().search([('company_id', '=', company_id)], limit=1)
+        if config:
+            return ConfigSnapshot(*(config[name] for name in ConfigSnapshot._fields))
+        # Not backfilled yet; report the field defaults
+        values = dict.fromkeys(ConfigSnapshot._fields)
+        values.update(self.default_get([name for name in ConfigSnapshot._fields if name != 'write_date']))
+        return ConfigSnapshot(**values)
+
+    @api.model
+    def _ensure_company_configs(self):
+        """Create missing configs for existing companies (install/upgrade)."""
+        companies = self.env['res.company'].sudo().search([
+            ('mcp_finance_config_ids', '=', False),
+        ])
+        if companies:
+            self.sudo().create([{'company_id': company.id} for company in companies])
+
 
 class ResConfigSettings(models.TransientModel):
     """Add MCP Finance settings to general settings."""
@@ -118,6 +178,11 @@ class ResCompany(models.Model):
     
     _inherit = 'res.company'
 
+    mcp_finance_config_ids = fields.One2many(
+        'mcp.finance.config',
+        'company_id',
+        string='MCP Finance Configs',
+    )
     mcp_finance_config_id = fields.Many2one(
         'mcp.finance.config',
         string='MCP Finance Config',
@@ -125,14 +190,40 @@ class ResCompany(models.Model):
         store=True,
     )
 
-    @api.depends('id')
+    @api.depends('mcp_finance_config_ids')
     def _compute_mcp_finance_config(self):
+        # Pure lookup: configs are created with the company, never here
         for company in self:
-            config = self.env['mcp.finance.config'].search(
-                [('company_id', '=', company.id)], limit=1
-            )
-            if not config:
-                config = self.env['mcp.finance.config'].create({
-                    'company_id': company.id
-                })
-            company.mcp_finance_config_id = config
+            company.mcp_finance_config_id = company.mcp_finance_config_ids[:1]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        companies = super().create(vals_list)
+        self.env['mcp.finance.config'].sudo().create([
+            {'company_id': company.id} for company in companies
+        ])
+        self.env.registry.clear_cache()
+        return companies
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if not _LOCK_DATE_FIELDS.isdisjoint(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _mcp_valid_company_ids(self):
+        """Return the ids of all companies, archived ones included."""
+        return frozenset(self.sudo().with_context(active_test=False).search([]).ids)
+
+    @tools.ormcache('self.id')
+    def _mcp_lock_dates(self):
+        """Return (fiscalyear_lock_date, period_lock_date), cached until they change."""
+        company = self.sudo()
+        return company.fiscalyear_lock_date, company.period_lock_date
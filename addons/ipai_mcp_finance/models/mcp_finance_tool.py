@@ -6,15 +6,127 @@ Registers finance-specific tools with the MCP server.
 
 This extends mcp_server's tool registry with accounting operations.
 """
-from odoo import models, fields, api
+from odoo import models, fields, api, tools, SUPERUSER_ID
 from odoo.exceptions import UserError, AccessError
+from odoo.modules.registry import Registry
+import atexit
 import json
 import logging
+import threading
+import time
+from collections import defaultdict, deque
 from datetime import date, datetime
 from decimal import Decimal
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _logger = logging.getLogger(__name__)
 
+# Pending audit log entries as (dbname, vals). A per-process daemon thread
+# drains them in batches so tool calls never wait on the INSERT.
+_LOG_QUEUE = deque()
+_LOG_LOCK = threading.Lock()
+_LOG_WAKEUP = threading.Event()
+_LOG_FLUSH_INTERVAL = 0.05  # seconds to let a batch accumulate
+_LOG_BATCH_SIZE = 500
+_log_flusher = None
+
+
+@lru_cache(maxsize=256)
+def _parse_schema(raw):
+    """Parse a tool's JSON parameter schema.
+
+    Keyed on the raw schema text, so a write to ``parameter_schema``
+    naturally misses the cache. Callers must not mutate the result.
+    """
+    return json.loads(raw)
+
+
+def _json_encode(value):
+    """Encode value as JSON bytes; anything non-JSON is stringified."""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str).encode()
+
+
+def _json_decode(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _flush_log_queue():
+    """Write up to one batch of queued logs. Return the number of entries."""
+    with _LOG_LOCK:
+        count = min(len(_LOG_QUEUE), _LOG_BATCH_SIZE)
+        entries = [_LOG_QUEUE.popleft() for _ in range(count)]
+    if not entries:
+        return 0
+
+    by_db = defaultdict(list)
+    for dbname, vals in entries:
+        by_db[dbname].append(vals)
+
+    for dbname, vals_list in by_db.items():
+        try:
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['mcp.finance.tool.execution']._create_logs(vals_list)
+        except Exception:
+            _logger.exception(
+                "Failed to write %s MCP Finance execution logs to %s",
+                len(vals_list), dbname,
+            )
+    return len(entries)
+
+
+def _enqueue_log(entry):
+    with _LOG_LOCK:
+        _LOG_QUEUE.append(entry)
+    _ensure_log_flusher()
+    _LOG_WAKEUP.set()
+
+
+def flush_on_shutdown():
+    """Drain the audit log queue before the process exits."""
+    while _flush_log_queue():
+        pass
+
+
+def _log_flusher_loop():
+    while True:
+        # Sleep until something is queued, then give the batch a moment
+        # to fill before writing it.
+        _LOG_WAKEUP.wait()
+        time.sleep(_LOG_FLUSH_INTERVAL)
+        _LOG_WAKEUP.clear()
+        while _flush_log_queue():
+            pass
+
+
+def _ensure_log_flusher():
+    """Start the flusher thread lazily, so each forked worker gets its own."""
+    global _log_flusher
+    if _log_flusher is not None and _log_flusher.is_alive():
+        return
+    with _LOG_LOCK:
+        if _log_flusher is None or not _log_flusher.is_alive():
+            _log_flusher = threading.Thread(
+                target=_log_flusher_loop,
+                name='mcp_finance_log_flusher',
+                daemon=True,
+            )
+            _log_flusher.start()
+
+
+atexit.register(flush_on_shutdown)
+
+
+# Verb prefixes stripped from technical names to find the config flag
+_CONFIG_FLAG_PREFIXES = ('get_', 'create_', 'run_', 'generate_')
+
 
 class McpFinanceTool(models.Model):
     """Registry for MCP Finance tools."""
@@ -48,10 +160,56 @@ class McpFinanceTool(models.Model):
         help='JSON Schema defining tool input parameters',
     )
 
+    # Name of the mcp.finance.config enable_* field gating this tool
+    config_flag = fields.Char(
+        string='Config Flag',
+        compute='_compute_config_flag',
+        store=True,
+    )
+
     _sql_constraints = [
         ('technical_name_unique', 'UNIQUE(technical_name)', 'Technical name must be unique'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_tools_version(self):
+        """
+        Return (latest write_date, tool count); cached until tools change.
+
+        The count catches deletions, which leave MAX(write_date) as is
+        unless the deleted tool was the last one written.
+        """
+        self.flush_model(['write_date'])
+        self.env.cr.execute("SELECT MAX(write_date), COUNT(*) FROM mcp_finance_tool")
+        return tuple(self.env.cr.fetchone())
+
+    @api.depends('technical_name')
+    def _compute_config_flag(self):
+        for tool in self:
+            name = tool.technical_name or ''
+            for prefix in _CONFIG_FLAG_PREFIXES:
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+                    break
+            tool.config_flag = f"enable_{name}"
+
     @api.model
     def get_tool_schema(self, technical_name):
         """Return tool schema for MCP protocol."""
@@ -62,29 +220,25 @@ class McpFinanceTool(models.Model):
         return {
             'name': tool.technical_name,
             'description': tool.description,
-            'inputSchema': json.loads(tool.parameter_schema) if tool.parameter_schema else {},
+            'inputSchema': _parse_schema(tool.parameter_schema) if tool.parameter_schema else {},
         }
 
     @api.model
     def list_available_tools(self, company_id=None):
         """List all tools available for the company."""
-        config = self.env['mcp.finance.config'].get_config(company_id)
-        tools = self.search([('active', '=', True)])
-        
-        available = []
-        for tool in tools:
-            # Check if tool is enabled in config
-            config_field = f"enable_{tool.technical_name.replace('get_', '').replace('create_', '').replace('run_', '').replace('generate_', '')}"
-            if hasattr(config, config_field) and not getattr(config, config_field, True):
-                continue
-            available.append({
-                'name': tool.technical_name,
-                'description': tool.description,
-                'category': tool.category,
-                'requires_approval': tool.requires_approval,
-            })
+        config_dict = self.env['mcp.finance.config'].get_config_snapshot(company_id)._asdict()
+        tool_rows = self.search_read(
+            [('active', '=', True)],
+            ['technical_name', 'description', 'category', 'requires_approval', 'config_flag'],
+        )
         
-        return available
+        # Check if tool is enabled in config (tools without a flag are on)
+        return [{
+            'name': tool['technical_name'],
+            'description': tool['description'],
+            'category': tool['category'],
+            'requires_approval': tool['requires_approval'],
+        } for tool in tool_rows if config_dict.get(tool['config_flag'], True)]
 
 
 class McpFinanceToolExecution(models.Model):
@@ -93,14 +247,14 @@ class McpFinanceToolExecution(models.Model):
     _name = 'mcp.finance.tool.execution'
     _description = 'MCP Finance Tool Execution Log'
     _order = 'create_date desc'
-    _rec_name = 'display_name'
+    _rec_names_search = ['tool_id']
 
     tool_id = fields.Many2one('mcp.finance.tool', string='Tool', required=True)
     company_id = fields.Many2one('res.company', string='Company', required=True)
     user_id = fields.Many2one('res.users', string='User', default=lambda self: self.env.user)
     
-    parameters = fields.Text(string='Input Parameters (JSON)')
-    result = fields.Text(string='Result (JSON)')
+    parameters = fields.Json(string='Input Parameters')
+    result = fields.Json(string='Result')
     
     state = fields.Selection([
         ('pending', 'Pending Approval'),
@@ -112,31 +266,119 @@ class McpFinanceToolExecution(models.Model):
     
     error_message = fields.Text(string='Error Message')
     execution_time_ms = fields.Integer(string='Execution Time (ms)')
-    
-    display_name = fields.Char(compute='_compute_display_name', store=True)
 
-    @api.depends('tool_id', 'create_date')
+    # Pretty-printed copies of the Json payloads for the form's code viewer
+    parameters_display = fields.Text(string='Input Parameters (JSON)', compute='_compute_payload_display')
+    result_display = fields.Text(string='Result (JSON)', compute='_compute_payload_display')
+
+    def init(self):
+        # Recent-first listing (/mcp/finance/executions) as an index-only
+        # scan; id is included since the endpoint returns it. Replaces the
+        # earlier mcp_fin_exec_recent_idx, which lacked id.
+        self.env.cr.execute("DROP INDEX IF EXISTS mcp_fin_exec_recent_idx")
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS mcp_fin_exec_recent_cover_idx
+                ON mcp_finance_tool_execution (create_date DESC)
+                INCLUDE (id, tool_id, state, user_id, execution_time_ms)
+        """)
+        # Small index for the pending/failed alert filters
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS mcp_fin_exec_alert_idx
+                ON mcp_finance_tool_execution (create_date DESC, tool_id)
+                WHERE state IN ('pending', 'failed')
+        """)
+
+    @api.depends('parameters', 'result')
+    def _compute_payload_display(self):
+        for record in self:
+            record.parameters_display = json.dumps(record.parameters, indent=2, default=str)
+            record.result_display = json.dumps(record.result, indent=2, default=str)
+
+    @api.depends('tool_id.technical_name', 'create_date')
     def _compute_display_name(self):
+        # Not stored: computed on demand from prefetched fields, so log
+        # inserts don't pay for a follow-up UPDATE.
         for record in self:
             record.display_name = f"{record.tool_id.technical_name} @ {record.create_date}"
 
     @api.model
     def log_execution(self, tool_name, company_id, parameters, result=None, 
                       error=None, execution_time_ms=0, state='executed'):
-        """Create execution log entry."""
-        tool = self.env['mcp.finance.tool'].search(
-            [('technical_name', '=', tool_name)], limit=1
-        )
-        if not tool:
-            _logger.warning(f"Logging execution for unknown tool: {tool_name}")
-            return None
-        
-        return self.create({
-            'tool_id': tool.id,
+        """
+        Queue an execution log entry.
+
+        Entries are written in batches by a background thread using their
+        own cursor. Successful executions are queued after the current
+        transaction commits; failures are queued immediately. In test mode
+        the entry is written in the current transaction instead.
+        """
+        # An unknown company (e.g. from a "Company not found" failure) would
+        # fail the foreign key; log it under the current company instead
+        valid_company_ids = self.env['res.company']._mcp_valid_company_ids()
+        if not isinstance(company_id, int) or company_id not in valid_company_ids:
+            company_id = self.env.company.id
+
+        vals = {
+            'tool_name': tool_name,
             'company_id': company_id,
-            'parameters': json.dumps(parameters) if parameters else None,
-            'result': json.dumps(result, default=str) if result else None,
+            'user_id': self.env.uid,
+            # Encoded now, so the flusher never reads the caller's live dicts;
+            # only the decode is left for when the row is written
+            'parameters': _json_encode(parameters) if parameters else None,
+            'result': _json_encode(result) if result else None,
             'error_message': error,
             'execution_time_ms': execution_time_ms,
             'state': 'failed' if error else state,
-        })
+        }
+
+        if self.env.registry.in_test_mode():
+            return self._create_logs([vals])
+
+        entry = (self.env.cr.dbname, vals)
+        if error:
+            # Failures are queued right away so they survive a rollback
+            _enqueue_log(entry)
+        else:
+            # Successes are queued once the transaction commits, so work
+            # that ends up rolled back is never logged as executed
+            self.env.cr.postcommit.add(lambda: _enqueue_log(entry))
+        return None
+
+    @api.model
+    def _create_logs(self, vals_list):
+        """Batch-create log rows, resolving tool names in one search."""
+        names = {vals['tool_name'] for vals in vals_list}
+        tools = self.env['mcp.finance.tool'].search([('technical_name', 'in', list(names))])
+        tool_ids = {tool.technical_name: tool.id for tool in tools}
+
+        to_create = []
+        for vals in vals_list:
+            vals = dict(vals)
+            tool_name = vals.pop('tool_name')
+            if tool_name not in tool_ids:
+                _logger.warning(f"Logging execution for unknown tool: {tool_name}")
+                continue
+            for key in ('parameters', 'result'):
+                if isinstance(vals.get(key), bytes):
+                    vals[key] = _json_decode(vals[key])
+            vals['tool_id'] = tool_ids[tool_name]
+            to_create.append(vals)
+
+        try:
+            with self.env.cr.savepoint():
+                return self.create(to_create)
+        except Exception:
+            _logger.exception(
+                "Batch insert of %s MCP Finance execution logs failed, retrying one by one",
+                len(to_create),
+            )
+
+        # Isolate each row so one bad entry doesn't cost the whole batch
+        records = self.browse()
+        for vals in to_create:
+            try:
+                with self.env.cr.savepoint():
+                    records |= self.create(vals)
+            except Exception:
+                _logger.exception("Dropping MCP Finance execution log: %s", vals)
+        return records
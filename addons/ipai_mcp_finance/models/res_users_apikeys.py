@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+API Key Resolution Cache
+------------------------
+Resolves MCP bearer tokens to users and caches the result per process,
+keeping the cache in sync with key revocation.
+
+Smart Delta: GAP_DELTA - extends res.users.apikeys via _inherit
+"""
+from odoo import models, api, fields
+import hashlib
+import threading
+import time
+
+# Resolved API keys: {digest: (uid, expires_at)}. The cache is per worker
+# process, so the TTL bounds how long a revoked key stays usable elsewhere.
+_AUTH_CACHE = {}
+_AUTH_CACHE_LOCK = threading.Lock()
+_AUTH_CACHE_TTL = 60
+_AUTH_CACHE_MAX = 1024
+
+
+def invalidate_auth_cache():
+    """Drop every cached API key resolution in this process."""
+    with _AUTH_CACHE_LOCK:
+        _AUTH_CACHE.clear()
+
+
+class ResUsersApikeys(models.Model):
+    """
+    Cache bearer-token lookups and invalidate them when keys are removed.
+
+    The cache is per worker process: removal only clears the worker
+    handling it, other workers keep a revoked key until its cache TTL
+    (60 s) expires. Entries never outlive the key's expiration_date.
+    """
+
+    _inherit = 'res.users.apikeys'
+
+    @api.model
+    def _mcp_resolve_uid(self, api_key):
+        """Return the id of the user owning a valid, unexpired api_key, or None."""
+        cache_key = hashlib.blake2b(
+            f"{self.env.cr.dbname}:{api_key}".encode(), digest_size=16
+        ).hexdigest()
+        now = time.monotonic()
+
+        with _AUTH_CACHE_LOCK:
+            cached = _AUTH_CACHE.get(cache_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        # Checks the key hash, scope and expiration_date
+        uid = self.sudo()._check_credentials(scope='rpc', key=api_key)
+        if not uid:
+            return None
+
+        # Bound the entry by the earliest expiry among the user's live keys,
+        # which is never later than this key's own expiry
+        self.env.cr.execute("""
+            SELECT MIN(expiration_date) FROM res_users_apikeys
+             WHERE user_id = %s
+               AND expiration_date >= now() at time zone 'utc'
+        """, (uid,))
+        expiration = self.env.cr.fetchone()[0]
+        expires_at = now + _AUTH_CACHE_TTL
+        if expiration:
+            remaining = (expiration - fields.Datetime.now()).total_seconds()
+            expires_at = min(expires_at, now + remaining)
+
+        with _AUTH_CACHE_LOCK:
+            if len(_AUTH_CACHE) >= _AUTH_CACHE_MAX:
+                _AUTH_CACHE.clear()
+            _AUTH_CACHE[cache_key] = (uid, expires_at)
+        return uid
+
+    def unlink(self):
+        # Also covers revocation: _remove() unlinks in Odoo 18. Expired keys are
+        # deleted with raw SQL by the _gc_user_apikeys autovacuum, but
+        # cache entries never outlive expiration_date anyway.
+        res = super().unlink()
+        self._invalidate_api_key_cache()
+        return res
+
+    def _invalidate_api_key_cache(self):
+        invalidate_auth_cache()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from . import utils
 from . import trial_balance
 from . import journal_entry
 from . import bir_compliance
@@ -11,7 +11,7 @@ Parameters:
 - company_id: int (optional)
 - period: str (YYYY-QN format, e.g., 2025-Q4)
 - vendor_ids: list[int] (optional, all if not specified)
-- output_format: str (dat, xlsx, pdf)
+- output_format: str (dat, xlsx)
 
 BIR Form 2307: Certificate of Creditable Tax Withheld at Source
 - Required for vendor payments with withholding tax
@@ -20,10 +20,12 @@ BIR Form 2307: Certificate of Creditable Tax Withheld at Source
 from odoo import models, api, _
 from odoo.exceptions import UserError, AccessError
 from datetime import datetime, date
+import base64
 import logging
 import time
 import json
 import io
+import re
 
 _logger = logging.getLogger(__name__)
 
@@ -48,6 +50,61 @@ class BirComplianceTool(models.AbstractModel):
         ('tax_withheld', 14),         # Tax withheld amount
     ]
 
+    # Quarter -> first month, and (month, day) of the last day
+    _QUARTER_START = {1: 1, 2: 4, 3: 7, 4: 10}
+    _QUARTER_END = {1: (3, 31), 2: (6, 30), 3: (9, 30), 4: (12, 31)}
+
+    # One DAT row (217 chars, see BIR_2307_FIELDS). Precision specs both
+    # truncate and pad, so a row is a single format call.
+    _DAT_ROW = '%s%010d%-9.9s0000%-50.50s%-100.100s%-5s%05.2f%-14s%-14s'
+
+    # Translation tables for DAT field cleanup
+    _DASH_STRIP = str.maketrans('', '', '-')
+    _DOT_STRIP = str.maketrans('', '', '.')
+
+    # Tax name keyword -> BIR Alpha Tax Code
+    _ATC_MAP = {
+        'PROFESSIONAL': 'WC010', 'WC010': 'WC010',
+        'RENTAL': 'WC020', 'WC020': 'WC020',
+        'SERVICE': 'WC100', 'WC100': 'WC100',
+        'GOODS': 'WC120', 'WC120': 'WC120',
+    }
+    _ATC_PATTERN = re.compile('|'.join(_ATC_MAP))
+    # When several keywords match, the first code listed here wins
+    _ATC_PRIORITY = ('WC010', 'WC020', 'WC100', 'WC120')
+
+    # Built once at import; returned as-is, so callers must not mutate it
+    _TOOL_SCHEMA = {
+        'name': 'generate_bir_2307',
+        'description': 'Generate Philippine BIR Form 2307 (Certificate of Creditable Tax Withheld at Source) for vendor payments with withholding tax.',
+        'inputSchema': {
+            'type': 'object',
+            'properties': {
+                'company_id': {
+                    'type': 'integer',
+                    'description': 'Company ID (optional, defaults to current company)',
+                },
+                'period': {
+                    'type': 'string',
+                    'pattern': '^\\d{4}-Q[1-4]$',
+                    'description': 'Reporting period in YYYY-QN format (e.g., 2025-Q4)',
+                },
+                'vendor_ids': {
+                    'type': 'array',
+                    'items': {'type': 'integer'},
+                    'description': 'Filter to specific vendor IDs (optional, all if not specified)',
+                },
+                'output_format': {
+                    'type': 'string',
+                    'enum': ['dat', 'xlsx'],
+                    'default': 'dat',
+                    'description': 'Output format: dat (BIR upload), xlsx (Excel)',
+                },
+            },
+            'required': ['period'],
+        },
+    }
+
     @api.model
     def execute(self, params):
         """
@@ -58,7 +115,7 @@ class BirComplianceTool(models.AbstractModel):
                 - company_id: int (optional)
                 - period: str YYYY-QN (required)
                 - vendor_ids: list[int] (optional)
-                - output_format: str dat|xlsx|pdf (default dat)
+                - output_format: str dat|xlsx (default dat)
         
         Returns:
             dict with:
@@ -73,12 +130,13 @@ class BirComplianceTool(models.AbstractModel):
         
         try:
             company_id = params.get('company_id') or self.env.company.id
-            company = self.env['res.company'].browse(company_id)
-            if not company.exists():
+            # Checked against a cached id set rather than probing with exists()
+            if company_id not in self.env['res.company']._mcp_valid_company_ids():
                 raise UserError(f"Company not found: {company_id}")
+            company = self.env['res.company'].browse(company_id)
             
             # Check tool is enabled
-            config = self.env['mcp.finance.config'].get_config(company_id)
+            config = self.env['mcp.finance.config'].get_config_snapshot(company_id)
             if not config.enable_bir_tools:
                 raise AccessError("BIR Compliance tools are disabled for this company")
             
@@ -92,26 +150,26 @@ class BirComplianceTool(models.AbstractModel):
             vendor_ids = params.get('vendor_ids')
             output_format = params.get('output_format', 'dat').lower()
             
-            if output_format not in ('dat', 'xlsx', 'pdf'):
-                raise UserError(f"Invalid output_format: {output_format}. Use dat, xlsx, or pdf")
+            if output_format not in ('dat', 'xlsx'):
+                raise UserError(f"Invalid output_format: {output_format}. Use dat or xlsx")
             
-            # Get withholding tax data
-            data = self._get_withholding_data(
+            # Withholding records are produced lazily while the output is
+            # written; totals fill in as they are consumed
+            totals = {'count': 0, 'base': 0.0, 'tax': 0.0}
+            records = self._iter_withholding_records(
                 company_id=company_id,
                 date_from=date_from,
                 date_to=date_to,
                 vendor_ids=vendor_ids,
+                totals=totals,
             )
             
             # Generate output
             if output_format == 'dat':
-                content, filename = self._generate_dat(data, period, company)
-            elif output_format == 'xlsx':
-                content, filename = self._generate_xlsx(data, period, company)
+                content, filename = self._generate_dat(records, period, company)
             else:
-                content, filename = self._generate_pdf(data, period, company)
+                content, filename = self._generate_xlsx(records, totals, period, company)
             
-            import base64
             file_content = base64.b64encode(content).decode('utf-8')
             
             execution_time = int((time.time() - start_time) * 1000)
@@ -122,9 +180,9 @@ class BirComplianceTool(models.AbstractModel):
                 company_id=company_id,
                 parameters=params,
                 result={
-                    'record_count': len(data['records']),
-                    'total_base': data['totals']['base'],
-                    'total_tax': data['totals']['tax'],
+                    'record_count': totals['count'],
+                    'total_base': totals['base'],
+                    'total_tax': totals['tax'],
                 },
                 execution_time_ms=execution_time,
             )
@@ -133,9 +191,9 @@ class BirComplianceTool(models.AbstractModel):
                 'success': True,
                 'file_content': file_content,
                 'filename': filename,
-                'record_count': len(data['records']),
-                'total_base': data['totals']['base'],
-                'total_tax': data['totals']['tax'],
+                'record_count': totals['count'],
+                'total_base': totals['base'],
+                'total_tax': totals['tax'],
                 'metadata': {
                     'company': company.name,
                     'period': period,
@@ -172,138 +230,149 @@ class BirComplianceTool(models.AbstractModel):
             if quarter < 1 or quarter > 4:
                 raise ValueError("Quarter must be 1-4")
             
-            # Quarter start/end dates
-            quarter_months = {
-                1: (1, 3),
-                2: (4, 6),
-                3: (7, 9),
-                4: (10, 12),
-            }
-            start_month, end_month = quarter_months[quarter]
-            
+            start_month = self._QUARTER_START[quarter]
             date_from = date(year, start_month, 1)
-            
-            # End of quarter
-            if end_month == 12:
-                date_to = date(year, 12, 31)
-            else:
-                import calendar
-                last_day = calendar.monthrange(year, end_month)[1]
-                date_to = date(year, end_month, last_day)
+            date_to = date(year, *self._QUARTER_END[quarter])
             
             return date_from, date_to
             
         except Exception:
             raise UserError(f"Invalid period format: {period}. Use YYYY-QN (e.g., 2025-Q4)")
 
-    def _get_withholding_data(self, company_id, date_from, date_to, vendor_ids=None):
+    def _iter_withholding_records(self, company_id, date_from, date_to,
+                                  vendor_ids=None, totals=None):
         """
-        Get withholding tax data from vendor bills.
+        Yield withholding tax records from vendor bills.
+        
+        If given, totals ({'count', 'base', 'tax'}) is updated as records
+        are yielded, so it is complete once the iterator is exhausted.
         
-        Looks for bills with withholding tax lines (typically negative tax amounts
-        or specific tax accounts configured for withholding).
+        Withholding taxes (described as withholding, or carrying an EWT/WC
+        code) are resolved once up front; only journal items of posted
+        vendor bills on those taxes are then selected, in one query.
         """
-        domain = [
-            ('company_id', '=', company_id),
-            ('move_type', '=', 'in_invoice'),
-            ('state', '=', 'posted'),
-            ('invoice_date', '>=', date_from),
-            ('invoice_date', '<=', date_to),
-        ]
+        # Archived taxes still appear on older bills
+        wht_taxes = self.env['account.tax'].with_context(active_test=False).search_read([
+            '|', '|',
+            ('description', 'ilike', 'withholding'),
+            ('name', 'ilike', 'EWT'),
+            ('name', 'ilike', 'WC'),
+        ], ['name', 'amount'])
+        taxes = {tax['id']: tax for tax in wht_taxes}
+        # Per-tax values are fixed for the run; compute them once
+        rate_by_tax = {tax_id: abs(tax['amount']) for tax_id, tax in taxes.items()}
+        # base = tax / rate * 100, folded into one multiplier per tax
+        factor_by_tax = {
+            tax_id: (100.0 / rate) if rate else 0.0
+            for tax_id, rate in rate_by_tax.items()
+        }
+        atc_by_tax = {tax_id: self._get_atc(tax) for tax_id, tax in taxes.items()}
+        if not taxes:
+            # Nothing can match; skip the journal item query entirely
+            return
         
-        if vendor_ids:
-            domain.append(('partner_id', 'in', vendor_ids))
+        self.env['account.move'].flush_model()
+        self.env['account.move.line'].flush_model()
         
-        bills = self.env['account.move'].search(domain)
+        query = """
+            SELECT am.partner_id, aml.tax_line_id, aml.balance,
+                   am.name, am.invoice_date
+              FROM account_move_line aml
+              JOIN account_move am ON am.id = aml.move_id
+             WHERE aml.tax_line_id = ANY(%s)
+               AND am.company_id = %s
+               AND am.move_type = 'in_invoice'
+               AND am.state = 'posted'
+               AND am.invoice_date BETWEEN %s AND %s
+        """
+        args = [list(taxes), company_id, date_from, date_to]
+        if vendor_ids:
+            # Deduplicate caller-supplied ids before handing them to SQL
+            query += " AND am.partner_id = ANY(%s)"
+            args.append(list(set(vendor_ids)))
+        # Same bill order as account.move's default _order, lines in id order
+        query += " ORDER BY am.date DESC, am.name DESC, am.invoice_date DESC, am.id DESC, aml.id"
         
-        records = []
-        totals = {'base': 0.0, 'tax': 0.0}
+        self.env.cr.execute(query, args)
+        lines = self.env.cr.fetchall()
         
-        for bill in bills:
-            # Find withholding tax lines
-            # This is simplified - real implementation would look for specific tax codes
-            wht_lines = bill.line_ids.filtered(
-                lambda l: l.tax_line_id and 
-                l.tax_line_id.description and 
-                'withholding' in l.tax_line_id.description.lower()
+        # Read every vendor (and their states) in one shot
+        partner_ids = list({line[0] for line in lines if line[0]})
+        partners = {
+            partner['id']: partner
+            for partner in self.env['res.partner'].browse(partner_ids).read(
+                ['vat', 'name', 'street', 'street2', 'city', 'state_id', 'zip']
             )
+        }
+        state_ids = list({p['state_id'][0] for p in partners.values() if p['state_id']})
+        state_names = {
+            state['id']: state['name']
+            for state in self.env['res.country.state'].browse(state_ids).read(['name'])
+        }
+        
+        if totals is None:
+            totals = {'count': 0, 'base': 0.0, 'tax': 0.0}
+        # Vendors repeat across bills; format each address once
+        addr_cache = {}
+        
+        for partner_id, tax_id, balance, bill_ref, bill_date in lines:
+            partner = partners.get(partner_id) or {}
+            address = addr_cache.get(partner_id)
+            if address is None:
+                address = addr_cache[partner_id] = self._format_address(partner, state_names)
             
-            if not wht_lines:
-                # Also check for EWT (Expanded Withholding Tax) codes
-                wht_lines = bill.line_ids.filtered(
-                    lambda l: l.tax_line_id and 
-                    l.tax_line_id.name and 
-                    ('EWT' in l.tax_line_id.name or 'WC' in l.tax_line_id.name)
-                )
+            # Get base amount (the income payment)
+            # For withholding, we need to calculate back from the tax
+            tax_rate = rate_by_tax.get(tax_id, 0)
+            tax_amount = abs(float(balance))  # numeric column -> Decimal
+            base_amount = tax_amount * factor_by_tax.get(tax_id, 0.0)
             
-            for wht_line in wht_lines:
-                partner = bill.partner_id
-                
-                # Get base amount (the income payment)
-                # For withholding, we need to calculate back from the tax
-                tax = wht_line.tax_line_id
-                tax_rate = abs(tax.amount) if tax else 0
-                tax_amount = abs(wht_line.balance)
-                
-                if tax_rate > 0:
-                    base_amount = (tax_amount / tax_rate) * 100
-                else:
-                    base_amount = 0
-                
-                record = {
-                    'vendor_tin': partner.vat or '',
-                    'vendor_name': partner.name or '',
-                    'vendor_address': self._format_address(partner),
-                    'atc': self._get_atc(tax),
-                    'tax_rate': tax_rate,
-                    'base_amount': base_amount,
-                    'tax_amount': tax_amount,
-                    'bill_ref': bill.name,
-                    'bill_date': bill.invoice_date,
-                }
-                records.append(record)
-                
-                totals['base'] += base_amount
-                totals['tax'] += tax_amount
-        
-        return {
-            'records': records,
-            'totals': totals,
-        }
+            totals['count'] += 1
+            totals['base'] += base_amount
+            totals['tax'] += tax_amount
+            
+            yield {
+                'vendor_tin': partner.get('vat') or '',
+                'vendor_name': partner.get('name') or '',
+                'vendor_address': address,
+                'atc': atc_by_tax.get(tax_id, 'WC010'),
+                'tax_rate': tax_rate,
+                'base_amount': base_amount,
+                'tax_amount': tax_amount,
+                'bill_ref': bill_ref,
+                'bill_date': bill_date,
+            }
 
-    def _format_address(self, partner):
-        """Format partner address for BIR."""
+    def _format_address(self, partner, state_names):
+        """Format partner address (a read() dict) for BIR."""
+        state = partner.get('state_id')
         parts = [
-            partner.street or '',
-            partner.street2 or '',
-            partner.city or '',
-            partner.state_id.name if partner.state_id else '',
-            partner.zip or '',
+            partner.get('street') or '',
+            partner.get('street2') or '',
+            partner.get('city') or '',
+            state_names.get(state[0], '') if state else '',
+            partner.get('zip') or '',
         ]
         return ', '.join(p for p in parts if p)[:100]
 
     def _get_atc(self, tax):
-        """Get Alpha Tax Code for withholding tax."""
+        """Get Alpha Tax Code for a withholding tax (a read() dict)."""
         # Map tax codes to BIR ATC codes
         # This is simplified - real implementation would use tax configuration
         if not tax:
             return 'WC010'  # Default
         
-        name = (tax.name or '').upper()
-        if 'PROFESSIONAL' in name or 'WC010' in name:
-            return 'WC010'
-        elif 'RENTAL' in name or 'WC020' in name:
-            return 'WC020'
-        elif 'SERVICE' in name or 'WC100' in name:
-            return 'WC100'
-        elif 'GOODS' in name or 'WC120' in name:
-            return 'WC120'
+        name = (tax.get('name') or '').upper()
+        codes = {self._ATC_MAP[keyword] for keyword in self._ATC_PATTERN.findall(name)}
+        for code in self._ATC_PRIORITY:
+            if code in codes:
+                return code
         
         return 'WC010'  # Default to professional fees
 
-    def _generate_dat(self, data, period, company):
-        """Generate BIR DAT file format."""
-        lines = []
+    def _generate_dat(self, records, period, company):
+        """Generate BIR DAT file format from an iterable of records."""
+        buf = io.BytesIO()
         
         # Parse period for header
         year, quarter = period.split('-Q')
@@ -311,43 +380,43 @@ class BirComplianceTool(models.AbstractModel):
         quarter_end_month = int(quarter) * 3
         returning_period = f"{quarter_end_month:02d}{year}"
         
-        for seq, record in enumerate(data['records'], 1):
-            # Format TIN (remove dashes, pad to 9 chars)
-            tin = (record['vendor_tin'] or '').replace('-', '')[:9].ljust(9)
-            
-            # Format amounts (14 chars, 2 decimal places, right-aligned)
-            base = f"{record['base_amount']:014.2f}".replace('.', '')
-            tax = f"{record['tax_amount']:014.2f}".replace('.', '')
-            
-            # Build line
-            line = (
-                f"{returning_period:6s}"
-                f"{seq:010d}"
-                f"{tin:9s}"
-                f"{'0000':4s}"  # Branch code
-                f"{record['vendor_name'][:50]:50s}"
-                f"{record['vendor_address'][:100]:100s}"
-                f"{record['atc']:5s}"
-                f"{record['tax_rate']:05.2f}"
-                f"{base:14s}"
-                f"{tax:14s}"
-            )
-            lines.append(line)
+        row_format = self._DAT_ROW
+        dash_strip = self._DASH_STRIP
+        dot_strip = self._DOT_STRIP
+        for seq, record in enumerate(records, 1):
+            if seq > 1:
+                buf.write(b'\r\n')
+            # TIN without dashes; amounts with 2 implied decimals. Vendor
+            # names may hold non-ASCII (e.g. Ñ), so rows stay UTF-8.
+            buf.write((row_format % (
+                returning_period,
+                seq,
+                (record['vendor_tin'] or '').translate(dash_strip),
+                record['vendor_name'],
+                record['vendor_address'],
+                record['atc'],
+                record['tax_rate'],
+                ('%014.2f' % record['base_amount']).translate(dot_strip),
+                ('%014.2f' % record['tax_amount']).translate(dot_strip),
+            )).encode('utf-8'))
         
-        content = '\r\n'.join(lines).encode('utf-8')
+        content = buf.getvalue()
         filename = f"BIR2307_{company.vat or 'TIN'}_{period}.dat"
         
         return content, filename
 
-    def _generate_xlsx(self, data, period, company):
-        """Generate Excel format with headers."""
+    def _generate_xlsx(self, records, totals, period, company):
+        """Generate Excel format with headers; totals must fill as records are read."""
         try:
             import xlsxwriter
         except ImportError:
             raise UserError("xlsxwriter library required for Excel export")
         
         output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        # constant_memory flushes each finished row to a temp file, so peak
+        # memory no longer grows with the record count. Rows must be written
+        # strictly in order, and set_column() must precede the first row.
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
         worksheet = workbook.add_worksheet('BIR 2307')
         
         # Headers
@@ -361,27 +430,34 @@ class BirComplianceTool(models.AbstractModel):
         money_format = workbook.add_format({'num_format': '#,##0.00'})
         date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
         
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
+        # Unformatted cells pick up their column's format, so money and date
+        # formats are set once per column instead of on every cell
+        worksheet.set_column(6, 7, None, money_format)
+        worksheet.set_column(9, 9, None, date_format)
+        
+        worksheet.write_row(0, 0, headers, header_format)
         
         # Data rows
-        for row, record in enumerate(data['records'], 1):
-            worksheet.write(row, 0, row)
-            worksheet.write(row, 1, record['vendor_tin'])
-            worksheet.write(row, 2, record['vendor_name'])
-            worksheet.write(row, 3, record['vendor_address'])
-            worksheet.write(row, 4, record['atc'])
-            worksheet.write(row, 5, record['tax_rate'])
-            worksheet.write(row, 6, record['base_amount'], money_format)
-            worksheet.write(row, 7, record['tax_amount'], money_format)
-            worksheet.write(row, 8, record['bill_ref'])
-            worksheet.write(row, 9, record['bill_date'], date_format)
+        write_row = worksheet.write_row
+        for row, record in enumerate(records, 1):
+            write_row(row, 0, [
+                row,
+                record['vendor_tin'],
+                record['vendor_name'],
+                record['vendor_address'],
+                record['atc'],
+                record['tax_rate'],
+                record['base_amount'],
+                record['tax_amount'],
+                record['bill_ref'],
+                record['bill_date'],
+            ])
         
         # Totals
-        total_row = len(data['records']) + 2
+        total_row = totals['count'] + 2
         worksheet.write(total_row, 5, 'TOTALS:', header_format)
-        worksheet.write(total_row, 6, data['totals']['base'], money_format)
-        worksheet.write(total_row, 7, data['totals']['tax'], money_format)
+        worksheet.write(total_row, 6, totals['base'], money_format)
+        worksheet.write(total_row, 7, totals['tax'], money_format)
         
         workbook.close()
         content = output.getvalue()
@@ -389,42 +465,7 @@ class BirComplianceTool(models.AbstractModel):
         
         return content, filename
 
-    def _generate_pdf(self, data, period, company):
-        """Generate PDF format (stub - would use report engine)."""
-        # For now, return Excel - PDF would use QWeb report
-        _logger.warning("PDF generation not yet implemented, returning XLSX")
-        return self._generate_xlsx(data, period, company)
-
     @api.model
     def get_tool_schema(self):
         """Return MCP tool schema for registration."""
-        return {
-            'name': 'generate_bir_2307',
-            'description': 'Generate Philippine BIR Form 2307 (Certificate of Creditable Tax Withheld at Source) for vendor payments with withholding tax.',
-            'inputSchema': {
-                'type': 'object',
-                'properties': {
-                    'company_id': {
-                        'type': 'integer',
-                        'description': 'Company ID (optional, defaults to current company)',
-                    },
-                    'period': {
-                        'type': 'string',
-                        'pattern': '^\\d{4}-Q[1-4]$',
-                        'description': 'Reporting period in YYYY-QN format (e.g., 2025-Q4)',
-                    },
-                    'vendor_ids': {
-                        'type': 'array',
-                        'items': {'type': 'integer'},
-                        'description': 'Filter to specific vendor IDs (optional, all if not specified)',
-                    },
-                    'output_format': {
-                        'type': 'string',
-                        'enum': ['dat', 'xlsx', 'pdf'],
-                        'default': 'dat',
-                        'description': 'Output format: dat (BIR upload), xlsx (Excel), pdf',
-                    },
-                },
-                'required': ['period'],
-            },
-        }
+        return self._TOOL_SCHEMA
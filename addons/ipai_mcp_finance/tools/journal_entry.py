@@ -24,7 +24,7 @@ Safety Controls:
 """
 from odoo import models, api, _
 from odoo.exceptions import UserError, AccessError, ValidationError
-from datetime import datetime, date
+from .utils import parse_date
 from decimal import Decimal, ROUND_HALF_UP
 import logging
 import time
@@ -32,8 +32,8 @@ import json
 
 _logger = logging.getLogger(__name__)
 
-# Tolerance for floating point comparison
-BALANCE_TOLERANCE = 0.01
+# Amounts are rounded to cents, so balanced entries compare exactly
+CENT = Decimal('0.01')
 
 
 class JournalEntryTool(models.AbstractModel):
@@ -61,7 +61,8 @@ class JournalEntryTool(models.AbstractModel):
                 - success: bool
                 - move_id: int (created move ID)
                 - move_name: str (sequence number)
-                - state: str (draft/posted)
+                - state: str (draft; auto_post moves are posted by a cron)
+                - posting_scheduled: bool
                 - requires_approval: bool
         """
         start_time = time.time()
@@ -69,12 +70,13 @@ class JournalEntryTool(models.AbstractModel):
         try:
             # Validate parameters
             company_id = params.get('company_id') or self.env.company.id
-            company = self.env['res.company'].browse(company_id)
-            if not company.exists():
+            # Checked against a cached id set rather than probing with exists()
+            if company_id not in self.env['res.company']._mcp_valid_company_ids():
                 raise UserError(f"Company not found: {company_id}")
+            company = self.env['res.company'].browse(company_id)
             
             # Check tool is enabled
-            config = self.env['mcp.finance.config'].get_config(company_id)
+            config = self.env['mcp.finance.config'].get_config_snapshot(company_id)
             if not config.enable_journal_entry:
                 raise AccessError("Journal Entry tool is disabled for this company")
             
@@ -83,7 +85,7 @@ class JournalEntryTool(models.AbstractModel):
             if not journal_code:
                 raise UserError("journal_code is required")
             
-            je_date = self._parse_date(params.get('date'))
+            je_date = parse_date(params.get('date'))
             if not je_date:
                 raise UserError("date is required (YYYY-MM-DD)")
             
@@ -111,11 +113,8 @@ class JournalEntryTool(models.AbstractModel):
             # Validate and build lines
             move_lines = self._build_move_lines(lines, company_id)
             
-            # Check balance
-            self._validate_balance(move_lines)
-            
-            # Calculate total for approval threshold
-            total_amount = sum(line.get('debit', 0) for line in move_lines)
+            # Check balance; the debit total doubles as the approval amount
+            total_amount = float(self._validate_balance(move_lines))
             
             # Determine if approval required
             requires_approval = False
@@ -128,21 +127,35 @@ class JournalEntryTool(models.AbstractModel):
             if requires_approval:
                 auto_post = False
             
-            # Create move
+            # Create the header, then all lines in one batch rather than
+            # through one2many commands. Balance is checked once, after
+            # every line exists; the savepoint drops the header if it fails.
             move_vals = {
                 'company_id': company_id,
                 'journal_id': journal.id,
                 'date': je_date,
                 'ref': ref,
-                'line_ids': [(0, 0, line) for line in move_lines],
                 'move_type': 'entry',
             }
             
-            move = self.env['account.move'].with_company(company_id).create(move_vals)
-            
-            # Auto-post if allowed
-            if auto_post and not requires_approval:
-                move.action_post()
+            with self.env.cr.savepoint():
+                move = self.env['account.move'].with_company(company_id).create(move_vals)
+                with move._check_balanced({'records': move}):
+                    self.env['account.move.line'].with_company(company_id).with_context(
+                        check_move_validity=False,
+                    ).create([
+                        # Amounts leave Decimal only at the ORM boundary
+                        dict(line, move_id=move.id,
+                             debit=float(line['debit']), credit=float(line['credit']))
+                        for line in move_lines
+                    ])
+            
+            # Auto-post if allowed. Posting is left to the cron, which
+            # batches sequencing across moves; trigger it to run right away.
+            posting_scheduled = bool(auto_post and not requires_approval)
+            if posting_scheduled:
+                move.sudo().mcp_auto_post_pending = True
+                self.env.ref('ipai_mcp_finance.ir_cron_post_mcp_pending_moves').sudo()._trigger()
             
             execution_time = int((time.time() - start_time) * 1000)
             
@@ -156,6 +169,7 @@ class JournalEntryTool(models.AbstractModel):
                     'move_id': move.id,
                     'move_name': move.name,
                     'total_amount': total_amount,
+                    'posting_scheduled': posting_scheduled,
                 },
                 execution_time_ms=execution_time,
                 state=state,
@@ -167,6 +181,7 @@ class JournalEntryTool(models.AbstractModel):
                 'move_name': move.name,
                 'state': move.state,
                 'requires_approval': requires_approval,
+                'posting_scheduled': posting_scheduled,
                 'total_amount': total_amount,
                 'metadata': {
                     'company': company.name,
@@ -194,94 +209,48 @@ class JournalEntryTool(models.AbstractModel):
                 'error_type': type(e).__name__,
             }
 
-    def _parse_date(self, date_str):
-        """Parse date string to date object."""
-        if not date_str:
-            return None
-        if isinstance(date_str, date):
-            return date_str
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            raise UserError(f"Invalid date format: {date_str}. Use YYYY-MM-DD")
-
     def _check_period_lock(self, company_id, je_date):
         """Check if the period is locked."""
-        company = self.env['res.company'].browse(company_id)
+        fiscalyear_lock_date, period_lock_date = (
+            self.env['res.company'].browse(company_id)._mcp_lock_dates()
+        )
         
         # Check fiscal year lock
-        if company.fiscalyear_lock_date and je_date <= company.fiscalyear_lock_date:
+        if fiscalyear_lock_date and je_date <= fiscalyear_lock_date:
             raise UserError(
-                f"Period is locked. Fiscal year lock date: {company.fiscalyear_lock_date}"
+                f"Period is locked. Fiscal year lock date: {fiscalyear_lock_date}"
             )
         
         # Check period lock for non-advisers
-        if company.period_lock_date and je_date <= company.period_lock_date:
+        if period_lock_date and je_date <= period_lock_date:
             if not self.env.user.has_group('account.group_account_manager'):
                 raise UserError(
-                    f"Period is locked for non-advisers. Lock date: {company.period_lock_date}"
+                    f"Period is locked for non-advisers. Lock date: {period_lock_date}"
                 )
 
     def _build_move_lines(self, lines, company_id):
         """Build and validate move line values."""
-        Account = self.env['account.account']
-        Partner = self.env['res.partner']
+        account_ids = self._resolve_accounts(lines, company_id)
+        partner_ids = self._resolve_partners(lines)
         
         move_lines = []
+        # The loop below only does dict lookups; bind the hot calls once
+        append = move_lines.append
         
         for i, line in enumerate(lines):
-            # Validate account
-            account_ref = line.get('account')
-            if not account_ref:
-                raise UserError(f"Line {i+1}: account is required")
-            
-            # Account can be code or ID
-            if isinstance(account_ref, int):
-                account = Account.browse(account_ref)
-            else:
-                account = Account.search([
-                    ('code', '=', account_ref),
-                    ('company_ids', 'in', [company_id]),
-                ], limit=1)
-            
-            if not account.exists():
-                raise UserError(f"Line {i+1}: account not found: {account_ref}")
-            
-            # Get amounts
-            debit = float(line.get('debit', 0))
-            credit = float(line.get('credit', 0))
-            
-            if debit < 0 or credit < 0:
-                raise UserError(f"Line {i+1}: debit and credit must be non-negative")
-            
-            if debit > 0 and credit > 0:
-                raise UserError(f"Line {i+1}: cannot have both debit and credit on same line")
-            
-            if debit == 0 and credit == 0:
-                raise UserError(f"Line {i+1}: must have either debit or credit amount")
+            debit, credit = self._parse_amounts(i, line)
             
             # Build line
             move_line = {
-                'account_id': account.id,
+                'account_id': account_ids[i],
                 'name': line.get('name') or line.get('label') or '/',
                 'debit': debit,
                 'credit': credit,
             }
             
             # Optional partner
-            partner_ref = line.get('partner')
-            if partner_ref:
-                if isinstance(partner_ref, int):
-                    partner = Partner.browse(partner_ref)
-                else:
-                    partner = Partner.search([
-                        '|',
-                        ('ref', '=', partner_ref),
-                        ('name', 'ilike', partner_ref),
-                    ], limit=1)
-                
-                if partner.exists():
-                    move_line['partner_id'] = partner.id
+            if partner_ids[i]:
+                move_line['partner_id'] = partner_ids[i]
             
             # Optional analytic
             analytic = line.get('analytic')
@@ -292,22 +261,122 @@ class JournalEntryTool(models.AbstractModel):
                 elif isinstance(analytic, int):
                     move_line['analytic_distribution'] = {str(analytic): 100}
             
-            move_lines.append(move_line)
+            append(move_line)
         
         return move_lines
 
+    def _resolve_accounts(self, lines, company_id):
+        """
+        Return the account ID of each line.
+        
+        Account references (code or ID) are resolved up front, in one
+        query per kind, instead of one search per line.
+        """
+        Account = self.env['account.account']
+        
+        account_codes = set()
+        account_ids = set()
+        for i, line in enumerate(lines):
+            account_ref = line.get('account')
+            if not account_ref:
+                raise UserError(f"Line {i+1}: account is required")
+            if isinstance(account_ref, int):
+                account_ids.add(account_ref)
+            else:
+                account_codes.add(account_ref)
+        
+        account_by_code = {}
+        if account_codes:
+            # code is company-dependent; read it as the target company
+            for account in Account.with_company(company_id).search_read([
+                ('code', 'in', list(account_codes)),
+                ('company_ids', 'in', [company_id]),
+            ], ['code']):
+                account_by_code.setdefault(account['code'], account['id'])
+        existing_account_ids = set(Account.browse(list(account_ids)).exists().ids)
+        
+        resolved = []
+        for i, line in enumerate(lines):
+            # Account can be code or ID
+            account_ref = line['account']
+            if isinstance(account_ref, int):
+                account_id = account_ref if account_ref in existing_account_ids else None
+            else:
+                account_id = account_by_code.get(account_ref)
+            
+            if not account_id:
+                raise UserError(f"Line {i+1}: account not found: {account_ref}")
+            resolved.append(account_id)
+        return resolved
+
+    def _resolve_partners(self, lines):
+        """Return the partner ID of each line (None if unset or not found)."""
+        # Most MCP entries are plain account/amount lines: skip the lookups
+        if not any(line.get('partner') for line in lines):
+            return [None] * len(lines)
+        Partner = self.env['res.partner']
+        
+        partner_refs = set()
+        partner_ids = set()
+        for line in lines:
+            partner_ref = line.get('partner')
+            if isinstance(partner_ref, int):
+                partner_ids.add(partner_ref)
+            elif partner_ref:
+                partner_refs.add(partner_ref)
+        
+        partner_by_ref = {}
+        if partner_refs:
+            for partner in Partner.search_read([('ref', 'in', list(partner_refs))], ['ref']):
+                partner_by_ref.setdefault(partner['ref'], partner['id'])
+            # Anything that isn't an exact ref falls back to a name match
+            for partner_ref in partner_refs - partner_by_ref.keys():
+                partner = Partner.search([('name', 'ilike', partner_ref)], limit=1)
+                if partner:
+                    partner_by_ref[partner_ref] = partner.id
+        existing_partner_ids = set(Partner.browse(list(partner_ids)).exists().ids)
+        
+        resolved = []
+        for line in lines:
+            partner_ref = line.get('partner')
+            if isinstance(partner_ref, int):
+                resolved.append(partner_ref if partner_ref in existing_partner_ids else None)
+            else:
+                resolved.append(partner_by_ref.get(partner_ref) if partner_ref else None)
+        return resolved
+
+    def _parse_amounts(self, index, line):
+        """Return a line's (debit, credit) as cent-rounded Decimals."""
+        # Exact decimal money; str() avoids binary float artifacts
+        debit = Decimal(str(line.get('debit') or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+        credit = Decimal(str(line.get('credit') or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+        
+        if debit < 0 or credit < 0:
+            raise UserError(f"Line {index+1}: debit and credit must be non-negative")
+        
+        if debit > 0 and credit > 0:
+            raise UserError(f"Line {index+1}: cannot have both debit and credit on same line")
+        
+        if debit == 0 and credit == 0:
+            raise UserError(f"Line {index+1}: must have either debit or credit amount")
+        
+        return debit, credit
+
     def _validate_balance(self, move_lines):
-        """Validate that debits equal credits."""
-        total_debit = sum(line.get('debit', 0) for line in move_lines)
-        total_credit = sum(line.get('credit', 0) for line in move_lines)
+        """Validate that debits equal credits. Return the total debit."""
+        total_debit = total_credit = Decimal(0)
+        for line in move_lines:
+            total_debit += line['debit']
+            total_credit += line['credit']
         
         diff = abs(total_debit - total_credit)
-        if diff > BALANCE_TOLERANCE:
+        if diff:
             raise ValidationError(
                 f"Journal entry is not balanced. "
                 f"Total debit: {total_debit:.2f}, Total credit: {total_credit:.2f}, "
                 f"Difference: {diff:.2f}"
             )
+        return total_debit
 
     @api.model
     def get_tool_schema(self):
@@ -372,7 +441,10 @@ class JournalEntryTool(models.AbstractModel):
                     'auto_post': {
                         'type': 'boolean',
                         'default': False,
-                        'description': 'Auto-post the entry (only if approval not required)',
+                        'description': (
+                            'Auto-post the entry (only if approval not required); '
+                            'posting runs in a scheduled job'
+                        ),
                     },
                 },
                 'required': ['journal_code', 'date', 'ref', 'lines'],
@@ -14,6 +14,7 @@ Parameters:
 - hierarchy: bool (include account hierarchy levels)
 - account_types: list[str] (filter by account types)
 - include_zero: bool (include zero-balance accounts)
+- format: str (rows, or columns for one list per field)
 
 Returns:
 - Hierarchical trial balance with debit/credit/balance columns
@@ -21,7 +22,8 @@ Returns:
 """
 from odoo import models, api
 from odoo.exceptions import UserError, AccessError
-from datetime import datetime, date
+from .utils import parse_date
+from datetime import date
 import logging
 import time
 import json
@@ -48,6 +50,7 @@ class TrialBalanceTool(models.AbstractModel):
                 - hierarchy: bool (default True)
                 - account_types: list[str] (optional filter)
                 - include_zero: bool (default False)
+                - format: str rows|columns (default rows)
         
         Returns:
             dict with:
@@ -60,18 +63,19 @@ class TrialBalanceTool(models.AbstractModel):
         try:
             # Validate and parse parameters
             company_id = params.get('company_id') or self.env.company.id
-            company = self.env['res.company'].browse(company_id)
-            if not company.exists():
+            # Checked against a cached id set rather than probing with exists()
+            if company_id not in self.env['res.company']._mcp_valid_company_ids():
                 raise UserError(f"Company not found: {company_id}")
+            company = self.env['res.company'].browse(company_id)
             
             # Check tool is enabled
-            config = self.env['mcp.finance.config'].get_config(company_id)
+            config = self.env['mcp.finance.config'].get_config_snapshot(company_id)
             if not config.enable_trial_balance:
                 raise AccessError("Trial Balance tool is disabled for this company")
             
             # Parse dates
-            date_from = self._parse_date(params.get('date_from'))
-            date_to = self._parse_date(params.get('date_to'))
+            date_from = parse_date(params.get('date_from'))
+            date_to = parse_date(params.get('date_to'))
             
             if not date_to:
                 date_to = date.today()
@@ -85,6 +89,9 @@ class TrialBalanceTool(models.AbstractModel):
             hierarchy = params.get('hierarchy', True)
             account_types = params.get('account_types', [])
             include_zero = params.get('include_zero', False)
+            layout = params.get('format', 'rows')
+            if layout not in ('rows', 'columns'):
+                raise UserError(f"Invalid format: {layout}. Use rows or columns")
             
             # Build query
             result = self._get_trial_balance(
@@ -94,7 +101,12 @@ class TrialBalanceTool(models.AbstractModel):
                 hierarchy=hierarchy,
                 account_types=account_types,
                 include_zero=include_zero,
+                layout=layout,
             )
+            if layout == 'columns':
+                account_count = len(result['accounts']['account_id'])
+            else:
+                account_count = len(result['accounts'])
             
             execution_time = int((time.time() - start_time) * 1000)
             
@@ -104,7 +116,7 @@ class TrialBalanceTool(models.AbstractModel):
                     tool_name='get_trial_balance',
                     company_id=company_id,
                     parameters=params,
-                    result={'row_count': len(result['accounts'])},
+                    result={'row_count': account_count},
                     execution_time_ms=execution_time,
                 )
             
@@ -115,7 +127,7 @@ class TrialBalanceTool(models.AbstractModel):
                     'company': company.name,
                     'date_from': str(date_from),
                     'date_to': str(date_to),
-                    'account_count': len(result['accounts']),
+                    'account_count': account_count,
                     'execution_time_ms': execution_time,
                 },
             }
@@ -139,101 +151,144 @@ class TrialBalanceTool(models.AbstractModel):
                 'error_type': type(e).__name__,
             }
 
-    def _parse_date(self, date_str):
-        """Parse date string to date object."""
-        if not date_str:
-            return None
-        if isinstance(date_str, date):
-            return date_str
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            raise UserError(f"Invalid date format: {date_str}. Use YYYY-MM-DD")
-
     def _get_trial_balance(self, company_id, date_from, date_to, 
-                           hierarchy=True, account_types=None, include_zero=False):
+                           hierarchy=True, account_types=None, include_zero=False,
+                           layout='rows'):
         """
         Build trial balance data.
         
-        Uses account.move.line aggregation for accuracy.
+        Uses account.move.line aggregation for accuracy. With layout
+        'columns', accounts is a dict of parallel lists keyed by the names
+        in columns instead of a list of row dicts.
         """
-        Account = self.env['account.account']
+        # code is company-dependent; read it as the reported company
+        Account = self.env['account.account'].with_company(company_id)
         MoveLine = self.env['account.move.line']
         
-        # Get accounts for company
-        domain = [('company_ids', 'in', [company_id])]
-        if account_types:
-            domain.append(('account_type', 'in', account_types))
-        
-        accounts = Account.search(domain, order='code')
-        
-        # Get move line totals per account
-        self.env.cr.execute("""
+        # Get move line totals per account. parent_state already implies a
+        # posted move, so account_move is not joined; account_account is,
+        # so the type filter and zero-balance skip happen in PostgreSQL.
+        # (code and name are jsonb in 18, so they come from the ORM.)
+        query = """
             SELECT 
                 aml.account_id,
                 COALESCE(SUM(aml.debit), 0) as total_debit,
-                COALESCE(SUM(aml.credit), 0) as total_credit,
-                COALESCE(SUM(aml.balance), 0) as balance
+                COALESCE(SUM(aml.credit), 0) as total_credit
             FROM account_move_line aml
-            JOIN account_move am ON aml.move_id = am.id
+            JOIN account_account aa ON aa.id = aml.account_id
             WHERE aml.company_id = %s
               AND aml.date >= %s
               AND aml.date <= %s
-              AND am.state = 'posted'
               AND aml.parent_state = 'posted'
-            GROUP BY aml.account_id
-        """, (company_id, date_from, date_to))
+        """
+        args = [company_id, date_from, date_to]
+        if account_types:
+            query += " AND aa.account_type = ANY(%s)"
+            args.append(list(account_types))
+        query += " GROUP BY aml.account_id"
+        if not include_zero:
+            query += " HAVING SUM(aml.debit) <> SUM(aml.credit)"
         
+        MoveLine.flush_model(['account_id', 'date', 'debit', 'credit', 'parent_state'])
+        self.env.cr.execute(query, args)
+        
+        # balance is debit - credit by construction; derive it from the
+        # exact numeric sums rather than aggregating it a third time
         totals_by_account = {
-            row[0]: {
-                'debit': float(row[1]),
-                'credit': float(row[2]),
-                'balance': float(row[3]),
+            account_id: {
+                'debit': float(debit),
+                'credit': float(credit),
+                'balance': float(debit - credit),
             }
-            for row in self.env.cr.fetchall()
+            for account_id, debit, credit in self.env.cr.fetchall()
         }
         
-        # Build result rows
-        rows = []
-        totals = {'debit': 0.0, 'credit': 0.0, 'balance': 0.0}
+        # Zero-balance accounts have no totals row, so only include_zero
+        # needs the full chart; otherwise the aggregate's ids are the rows
+        if include_zero:
+            domain = [('company_ids', 'in', [company_id])]
+            if account_types:
+                domain.append(('account_type', 'in', account_types))
+            accounts = Account.search(domain, order='code')
+        else:
+            accounts = Account.browse(list(totals_by_account))
         
-        for account in accounts:
-            amounts = totals_by_account.get(account.id, {
-                'debit': 0.0, 'credit': 0.0, 'balance': 0.0
-            })
-            
-            # Skip zero balances if not requested
-            if not include_zero and amounts['balance'] == 0:
-                continue
-            
-            row = {
-                'account_id': account.id,
-                'code': account.code,
-                'name': account.name,
-                'account_type': account.account_type,
-                'internal_group': account.internal_group,
-                'debit': amounts['debit'],
-                'credit': amounts['credit'],
-                'balance': amounts['balance'],
+        # One batched read for the metadata instead of per-record access
+        fnames = ['code', 'name', 'account_type', 'internal_group']
+        if hierarchy:
+            fnames.append('group_id')
+        # load=None keeps group_id a plain id (no display_name lookup)
+        account_rows = accounts.read(fnames, load=None)
+        if not include_zero:
+            account_rows.sort(key=lambda account: account['code'] or '')
+        if hierarchy:
+            # All referenced groups' names in one read
+            group_ids = {account['group_id'] for account in account_rows if account['group_id']}
+            group_names = {
+                group['id']: group['name']
+                for group in self.env['account.group'].browse(list(group_ids)).read(['name'])
             }
+        
+        columns = [
+            'account_id', 'code', 'name', 'account_type', 'internal_group',
+            'debit', 'credit', 'balance',
+        ]
+        if hierarchy:
+            columns += ['group_id', 'group_name', 'level']
+        
+        # Build result rows as tuples; they become dicts or columns below
+        records = []
+        append = records.append
+        total_debit = total_credit = 0.0
+        no_amounts = {'debit': 0.0, 'credit': 0.0, 'balance': 0.0}
+        
+        for account in account_rows:
+            amounts = totals_by_account.get(account['id'], no_amounts)
+            
+            values = (
+                account['id'],
+                account['code'],
+                account['name'],
+                account['account_type'],
+                account['internal_group'],
+                amounts['debit'],
+                amounts['credit'],
+                amounts['balance'],
+            )
             
             # Add hierarchy info
             if hierarchy:
-                row['group_id'] = account.group_id.id if account.group_id else None
-                row['group_name'] = account.group_id.name if account.group_id else None
-                row['level'] = len(account.code.split('.')) if '.' in account.code else 1
+                group_id = account['group_id'] or None
+                values += (
+                    group_id,
+                    group_names.get(group_id),
+                    account['code'].count('.') + 1,
+                )
             
-            rows.append(row)
+            append(values)
             
-            totals['debit'] += amounts['debit']
-            totals['credit'] += amounts['credit']
-            totals['balance'] += amounts['balance']
+            total_debit += amounts['debit']
+            total_credit += amounts['credit']
         
-        return {
-            'accounts': rows,
-            'totals': totals,
+        result = {
+            'totals': {
+                'debit': total_debit,
+                'credit': total_credit,
+                'balance': total_debit - total_credit,
+            },
             'currency': self.env.company.currency_id.name,
         }
+        if layout == 'columns':
+            # One list per column: much smaller to hold and encode than a
+            # dict per account on large charts
+            result['columns'] = columns
+            result['accounts'] = dict(zip(
+                columns,
+                [list(column) for column in zip(*records)] or [[] for _ in columns],
+            ))
+        else:
+            result['accounts'] = [dict(zip(columns, values)) for values in records]
+        return result
 
     @api.model
     def get_tool_schema(self):
@@ -273,6 +328,12 @@ class TrialBalanceTool(models.AbstractModel):
                         'default': False,
                         'description': 'Include accounts with zero balance',
                     },
+                    'format': {
+                        'type': 'string',
+                        'enum': ['rows', 'columns'],
+                        'default': 'rows',
+                        'description': 'rows: one object per account; columns: one array per field',
+                    },
                 },
                 'required': [],
             },
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+MCP Finance Tool Helpers
+------------------------
+Parameter parsing shared by the finance tools.
+"""
+from odoo.exceptions import UserError
+from datetime import date
+
+
+def parse_date(date_str):
+    """Parse a YYYY-MM-DD string (or pass a date through) to a date object."""
+    if not date_str:
+        return None
+    if isinstance(date_str, date):
+        return date_str
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        raise UserError(f"Invalid date format: {date_str}. Use YYYY-MM-DD")
@@ -3,7 +3,23 @@
 
 import os
 import sys
-import xmlrpc.client
+
+import requests
+
+
+def _jsonrpc(session, url, service, method, *args):
+    """Call an Odoo JSON-RPC service method and return its result."""
+    response = session.post(f'{url}/jsonrpc', json={
+        'jsonrpc': '2.0',
+        'method': 'call',
+        'params': {'service': service, 'method': method, 'args': args},
+    })
+    response.raise_for_status()
+    payload = response.json()
+    if 'error' in payload:
+        error = payload['error']
+        raise RuntimeError(error.get('data', {}).get('message') or error.get('message'))
+    return payload['result']
 
 
 def test_mcp_registration():
@@ -20,41 +36,37 @@ def test_mcp_registration():
         'generate_bir_2307'
     ]
 
+    # One keep-alive session carries every call over the same connection
+    session = requests.Session()
     try:
         # Connect to Odoo
-        common = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/common')
-        uid = common.authenticate(db, username, password, {})
+        uid = _jsonrpc(session, url, 'common', 'authenticate',
+                       db, username, password, {})
 
         if not uid:
             print("❌ Authentication failed")
             return False
 
-        models = xmlrpc.client.ServerProxy(f'{url}/xmlrpc/2/object')
-
-        # Search for registered tools
-        tool_ids = models.execute_kw(
+        # Fetch registered tools and their state in one round-trip
+        tools = _jsonrpc(
+            session, url, 'object', 'execute_kw',
             db, uid, password,
-            'mcp.finance.tool', 'search',
-            [[['name', 'in', expected_tools]]]
+            'mcp.finance.tool', 'search_read',
+            [[['technical_name', 'in', expected_tools]]],
+            # Include archived tools so they are reported as disabled
+            {'fields': ['technical_name', 'active'], 'context': {'active_test': False}}
         )
 
-        if len(tool_ids) != len(expected_tools):
-            print(f"❌ Expected {len(expected_tools)} tools, found {len(tool_ids)}")
+        if len(tools) != len(expected_tools):
+            print(f"❌ Expected {len(expected_tools)} tools, found {len(tools)}")
             return False
 
-        # Read tool details
-        tools = models.execute_kw(
-            db, uid, password,
-            'mcp.finance.tool', 'read',
-            [tool_ids, ['name', 'enabled']]
-        )
-
         # Verify all tools are enabled
         for tool in tools:
-            if not tool.get('enabled'):
-                print(f"❌ Tool {tool['name']} is not enabled")
+            if not tool.get('active'):
+                print(f"❌ Tool {tool['technical_name']} is not enabled")
                 return False
-            print(f"✅ Tool registered and enabled: {tool['name']}")
+            print(f"✅ Tool registered and enabled: {tool['technical_name']}")
 
         print(f"✅ All {len(expected_tools)} MCP tools registered successfully")
         return True
@@ -62,6 +74,8 @@ def test_mcp_registration():
     except Exception as e:
         print(f"❌ Error testing MCP registration: {e}")
         return False
+    finally:
+        session.close()
 
 
 if __name__ == '__main__':
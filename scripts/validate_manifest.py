@@ -3,6 +3,18 @@
 
 import sys
 import ast
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _load_manifest(manifest_path, mtime):
+    """Parse a manifest's dict literal. mtime is part of the key so edits re-parse."""
+    with open(manifest_path, 'r') as f:
+        manifest_code = f.read()
+
+    # Same as Odoo's loader: the whole file must be one literal
+    return ast.literal_eval(manifest_code)
 
 
 def validate_manifest(manifest_path):
@@ -13,11 +25,8 @@ def validate_manifest(manifest_path):
     ]
 
     try:
-        with open(manifest_path, 'r') as f:
-            manifest_code = f.read()
-
-        # Parse manifest as Python dict
-        manifest = ast.literal_eval(manifest_code)
+        # Parse manifest as Python dict (cached while the file is unchanged)
+        manifest = _load_manifest(manifest_path, os.path.getmtime(manifest_path))
 
         # Check required fields
         missing_fields = [f for f in required_fields if f not in manifest]